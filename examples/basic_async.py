@@ -1,9 +1,20 @@
+# optional faster event loop:
+# python3 -m pip install uvloop
+
 import asyncio
 import logging
+import sys
 import time
 
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 from v4l2py.device import Device, VideoCapture
 
+FMT = "frame %04d %.1f Kb at %.1f fps ; data=%d; elapsed=%.2f s;\r"
+
 
 async def loop(variable):
     while True:
@@ -11,33 +22,73 @@ async def loop(variable):
         variable[0] += 1
 
 
+async def report(stats, data):
+    """Display statistics at 10 Hz, outside of the acquisition loop"""
+    start = last = time.monotonic()
+    last_nb = 0
+    while True:
+        await asyncio.sleep(0.1)
+        new, nb = time.monotonic(), stats["nb"]
+        fps = (nb - last_nb) / (new - last)
+        sys.stdout.write(
+            FMT % (stats["frame_nb"], stats["size"] / 1000, fps, data[0], new - start)
+        )
+        sys.stdout.flush()
+        last, last_nb = new, nb
+
+
+async def produce(stream, queue):
+    """Prefetch frames. Ends with None or with the error that stopped it"""
+    try:
+        async for frame in stream:
+            await queue.put(frame)
+    except Exception as error:
+        await queue.put(error)
+    else:
+        await queue.put(None)
+
+
 async def main():
     fmt = "%(threadName)-10s %(asctime)-15s %(levelname)-5s %(name)s: %(message)s"
     logging.basicConfig(level="INFO", format=fmt)
 
+    if hasattr(asyncio, "eager_task_factory"):  # python >= 3.12
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
     data = [0]
     asyncio.create_task(loop(data))
+    stats = {"nb": 0, "frame_nb": 0, "size": 0}
+    asyncio.create_task(report(stats, data))
 
     with Device.from_id(0) as device:
-        capture = VideoCapture(device)
+        capture = VideoCapture(device, size=4)
         capture.set_format(640, 480, "MJPG")
         with capture as stream:
-            start = last = time.monotonic()
-            last_update = 0
-            async for frame in stream:
-                new = time.monotonic()
-                fps, last = 1 / (new - last), new
-                if new - last_update > 0.1:
-                    elapsed = new - start
-                    print(
-                        f"frame {frame.frame_nb:04d} {len(frame)/1000:.1f} Kb at {fps:.1f} fps ; "
-                        f" data={data[0]}; {elapsed=:.2f} s;",
-                        end="\r",
-                    )
-                    last_update = new
+            # prefetch next frame while the current one is being processed
+            frames = asyncio.Queue(maxsize=2)
+            producer = asyncio.create_task(produce(stream, frames))
+            try:
+                while True:
+                    if frames.empty():
+                        frame = await frames.get()
+                    else:
+                        # get() would not suspend: let other tasks run
+                        await asyncio.sleep(0)
+                        frame = frames.get_nowait()
+                    if frame is None:
+                        break
+                    if isinstance(frame, Exception):
+                        raise frame
+                    stats["nb"] += 1
+                    stats["frame_nb"] = frame.frame_nb
+                    stats["size"] = len(frame)
+            finally:
+                producer.cancel()
+
 
+run = asyncio.run if uvloop is None else uvloop.run
 
 try:
-    asyncio.run(main())
+    run(main())
 except KeyboardInterrupt:
     logging.info("Ctrl-C pressed. Bailing out")
@@ -1,11 +1,14 @@
 import logging
+import sys
 import time
 
 import gevent
 
-from v4l2py.device import Device
+from v4l2py.device import Device, VideoCapture
 from v4l2py.io import GeventIO
 
+FMT = "frame %04d %.1f Kb at %.1f fps ; data=%d; elapsed=%.2f s;\r"
+
 
 def loop(variable):
     while True:
@@ -13,27 +16,36 @@ def loop(variable):
         variable[0] += 1
 
 
+def report(stats, data):
+    """Display statistics at 10 Hz, outside of the acquisition loop"""
+    start = last = time.monotonic()
+    last_nb = 0
+    while True:
+        gevent.sleep(0.1)
+        new, nb = time.monotonic(), stats["nb"]
+        fps = (nb - last_nb) / (new - last)
+        sys.stdout.write(
+            FMT % (stats["frame_nb"], stats["size"] / 1000, fps, data[0], new - start)
+        )
+        sys.stdout.flush()
+        last, last_nb = new, nb
+
+
 def main():
     fmt = "%(threadName)-10s %(asctime)-15s %(levelname)-5s %(name)s: %(message)s"
     logging.basicConfig(level="INFO", format=fmt)
 
     data = [0]
     gevent.spawn(loop, data)
-
-    with Device.from_id(0, io=GeventIO) as stream:
-        start = last = time.monotonic()
-        last_update = 0
-        for frame in stream:
-            new = time.monotonic()
-            fps, last = 1 / (new - last), new
-            if new - last_update > 0.1:
-                elapsed = new - start
-                print(
-                    f"frame {frame.frame_nb:04d} {len(frame)/1000:.1f} Kb at {fps:.1f} fps ; "
-                    f"data={data[0]}; {elapsed=:.2f} s;",
-                    end="\r",
-                )
-                last_update = new
+    stats = {"nb": 0, "frame_nb": 0, "size": 0}
+    gevent.spawn(report, stats, data)
+
+    with Device.from_id(0, io=GeventIO) as device:
+        with VideoCapture(device, size=4) as stream:
+            for frame in stream:
+                stats["nb"] += 1
+                stats["frame_nb"] = frame.frame_nb
+                stats["size"] = len(frame)
 
 
 try:
@@ -1,26 +1,42 @@
 import logging
+import sys
+import threading
 import time
 
-from v4l2py.device import Device
+from v4l2py.device import Device, VideoCapture
+
+FMT = "frame %04d %.1f Kb at %.1f fps; elapsed=%.2f s;\r"
+
+
+def report(stats):
+    """Display statistics at 10 Hz, outside of the acquisition loop"""
+    start = last = time.monotonic()
+    last_nb = 0
+    while True:
+        time.sleep(0.1)
+        new, nb = time.monotonic(), stats["nb"]
+        fps = (nb - last_nb) / (new - last)
+        sys.stdout.write(
+            FMT % (stats["frame_nb"], stats["size"] / 1000, fps, new - start)
+        )
+        sys.stdout.flush()
+        last, last_nb = new, nb
 
 
 def main():
     fmt = "%(threadName)-10s %(asctime)-15s %(levelname)-5s %(name)s: %(message)s"
     logging.basicConfig(level="INFO", format=fmt)
 
-    with Device.from_id(0) as stream:
-        start = last = time.monotonic()
-        last_update = 0
-        for frame in stream:
-            new = time.monotonic()
-            fps, last = 1 / (new - last), new
-            if new - last_update > 0.1:
-                elapsed = new - start
-                print(
-                    f"frame {frame.frame_nb:04d} {len(frame)/1000:.1f} Kb at {fps:.1f} fps; {elapsed=:.2f} s;",
-                    end="\r",
-                )
-                last_update = new
+    stats = {"nb": 0, "frame_nb": 0, "size": 0}
+    threading.Thread(target=report, args=(stats,), name="Report", daemon=True).start()
+
+    # 4 buffers (instead of the default 2) so python hiccups don't drop frames
+    with Device.from_id(0) as device:
+        with VideoCapture(device, size=4) as stream:
+            for frame in stream:
+                stats["nb"] += 1
+                stats["frame_nb"] = frame.frame_nb
+                stats["size"] = len(frame)
 
 
 try:
@@ -1,13 +1,19 @@
-import cv2
+import numpy
 from qtpy import QtCore, QtGui, QtWidgets
+from turbojpeg import TJPF_BGRX, TurboJPEG
 
 from v4l2py import Device, VideoCapture
 
+jpeg = TurboJPEG()
+
+# decode destination and the QImage aliasing it are allocated once
+bgrx = numpy.empty((480, 640, 4), dtype="u1")
+img = QtGui.QImage(bgrx, 640, 480, QtGui.QImage.Format.Format_RGB32)
+
 
 def update():
     frame = next(stream)
-    bgr = cv2.imdecode(frame.array, cv2.IMREAD_UNCHANGED)
-    img = QtGui.QImage(bgr, 640, 480, QtGui.QImage.Format.Format_BGR888)
+    jpeg.decode(frame.data, pixel_format=TJPF_BGRX, dst=bgrx)
     label.setPixmap(QtGui.QPixmap.fromImage(img))
     app.processEvents()
 
@@ -22,8 +28,9 @@ timer = QtCore.QTimer()
 timer.timeout.connect(update)
 
 with Device.from_id(0) as cam:
-    capture = VideoCapture(cam)
+    capture = VideoCapture(cam, size=4)
     capture.set_format(640, 480, "MJPG")
-    stream = iter(cam)
-    timer.start(0)
-    app.exec()
+    with capture:
+        stream = iter(capture)
+        timer.start(0)
+        app.exec()
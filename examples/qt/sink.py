@@ -0,0 +1,73 @@
+#
+# This file is part of the v4l2py project
+#
+# Copyright (c) 2021 Tiago Coutinho
+# Distributed under the GPLv3 license. See LICENSE for more info.
+
+# install extra requirements:
+# python3 -m pip install qtpy pyqt6
+
+# run from this directory with:
+# QT_API=pyqt6 python sink.py
+
+"""Display frames through a Qt video sink.
+
+Frames are handed to Qt in the camera pixel format (no conversion to BGR
+on the CPU). Qt takes care of the color space conversion when rendering.
+"""
+
+from qtpy import QtCore, QtMultimedia, QtMultimediaWidgets, QtWidgets
+
+from v4l2py import Device, PixelFormat, VideoCapture
+
+QFormat = QtMultimedia.QVideoFrameFormat.PixelFormat
+
+PIXEL_FORMATS = {
+    PixelFormat.YUYV: QFormat.Format_YUYV,
+    PixelFormat.MJPEG: QFormat.Format_Jpeg,
+    PixelFormat.JPEG: QFormat.Format_Jpeg,
+}
+
+
+class QVideo(QtMultimediaWidgets.QVideoWidget):
+    def setFrame(self, frame):
+        size = QtCore.QSize(frame.width, frame.height)
+        fmt = QtMultimedia.QVideoFrameFormat(size, PIXEL_FORMATS[frame.pixel_format])
+        qframe = QtMultimedia.QVideoFrame(fmt)
+        qframe.map(QtMultimedia.QVideoFrame.MapMode.WriteOnly)
+        try:
+            bits = qframe.bits(0)
+            if hasattr(bits, "setsize"):  # PyQt returns a sip.voidptr
+                bits.setsize(qframe.mappedBytes(0))
+            memoryview(bits)[: len(frame)] = frame.data
+        finally:
+            qframe.unmap()
+        self.videoSink().setVideoFrame(qframe)
+
+
+def main():
+    def update():
+        frame = next(stream)
+        window.setFrame(frame)
+
+    app = QtWidgets.QApplication([])
+    window = QVideo()
+    window.resize(640, 480)
+    window.show()
+
+    timer = QtCore.QTimer()
+    timer.timeout.connect(update)
+
+    with Device.from_id(0) as cam:
+        capture = VideoCapture(cam, size=4)
+
+        capture.set_format(640, 480, "YUYV")
+        print(capture.get_format())
+        with capture:
+            stream = iter(capture)
+            timer.start(0)
+            app.exec()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,61 +5,166 @@
 # Distributed under the GPLv3 license. See LICENSE for more info.
 
 # install extra requirements:
-# python3 -m pip install opencv-python qtpy pyqt6
+# python3 -m pip install opencv-python PyTurboJPEG qtpy pyqt6
+#
+# optional MJPEG decoding on NVIDIA GPUs (--jpeg-decoder=nvjpeg):
+# python3 -m pip install pynvjpeg
 
 # run from this directory with:
 # QT_API=pyqt6 python widget.py
 
+import argparse
+import logging
+
 import cv2
+import numpy
 from qtpy import QtCore, QtGui, QtWidgets
 
 from v4l2py import Device, PixelFormat, VideoCapture
 
 
+def turbojpeg_decoder():
+    from turbojpeg import TJPF_BGRX, TurboJPEG
+
+    jpeg = TurboJPEG()
+
+    def decode(data, bgrx):
+        jpeg.decode(data, pixel_format=TJPF_BGRX, dst=bgrx)
+
+    return decode
+
+
+def nvjpeg_decoder():
+    from nvjpeg import NvJpeg
+
+    jpeg = NvJpeg()
+
+    def decode(data, bgrx):
+        cv2.cvtColor(jpeg.decode(data), cv2.COLOR_BGR2BGRA, dst=bgrx)
+
+    return decode
+
+
+JPEG_DECODERS = {"turbojpeg": turbojpeg_decoder, "nvjpeg": nvjpeg_decoder}
+
+
+class Decoder(QtCore.QThread):
+    """Decodes frames outside of the GUI thread"""
+
+    imageReady = QtCore.Signal(QtGui.QImage)
+
+    def __init__(self, stream, decode_jpeg, opencl=False, parent=None):
+        super().__init__(parent)
+        self.stream = stream
+        self.decode_jpeg = decode_jpeg
+        # YUYV conversion on the OpenCL device (T-API) into a persistent UMat
+        self.umat = cv2.UMat() if opencl else None
+        # frames are decoded/converted in place into persistent BGRX buffers
+        # aliased by QImages: no per frame allocation. Double buffered: one
+        # is displayed while the other is written
+        self.buffers = [(None, None), (None, None)]
+        self.free = QtCore.QSemaphore(len(self.buffers))
+
+    def release(self):
+        self.free.release()
+
+    def buffer(self, index, width, height):
+        bgrx, image = self.buffers[index]
+        if bgrx is None or bgrx.shape[:2] != (height, width):
+            bgrx = numpy.empty((height, width, 4), dtype="u1")
+            image = QtGui.QImage(bgrx, width, height, QtGui.QImage.Format.Format_RGB32)
+            self.buffers[index] = bgrx, image
+        return bgrx, image
+
+    def run(self):
+        index = 0
+        for frame in self.stream:
+            while not self.free.tryAcquire(1, 100):
+                if self.isInterruptionRequested():
+                    return
+            if self.isInterruptionRequested():
+                return
+            bgrx, image = self.buffer(index, frame.width, frame.height)
+            if frame.pixel_format == PixelFormat.MJPEG:
+                try:
+                    self.decode_jpeg(frame.data, bgrx)
+                except Exception:
+                    # cameras do emit corrupt MJPEG frames: skip to the next one
+                    logging.exception("Failed to decode frame %d", frame.frame_nb)
+                    self.free.release()
+                    continue
+            elif frame.pixel_format == PixelFormat.YUYV:
+                data = frame.array
+                data.shape = frame.height, frame.width, -1
+                if self.umat is None:
+                    cv2.cvtColor(data, cv2.COLOR_YUV2BGRA_YUYV, dst=bgrx)
+                else:
+                    # not allocation free: the python bindings can neither
+                    # upload into nor download (get) from an existing buffer,
+                    # so each frame allocates a UMat and a temporary array
+                    yuyv = cv2.UMat(data)
+                    cv2.cvtColor(yuyv, cv2.COLOR_YUV2BGRA_YUYV, dst=self.umat)
+                    bgrx[:] = self.umat.get()
+            self.imageReady.emit(image)
+            index = 1 - index
+
+
 class QVideo(QtWidgets.QWidget):
-    def setFrame(self, frame):
-        self.frame = frame
+    released = QtCore.Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
         self.image = None
+
+    def setImage(self, image):
+        previous, self.image = self.image, image
+        if previous is not None:
+            self.released.emit()
         self.update()
 
     def paintEvent(self, _):
-        frame = self.frame
-        if frame is None:
-            return
         if self.image is None:
-            if frame.pixel_format == PixelFormat.MJPEG:
-                bgr = cv2.imdecode(frame.array, cv2.IMREAD_UNCHANGED)
-            elif frame.pixel_format == PixelFormat.YUYV:
-                data = frame.array
-                data.shape = frame.height, frame.width, -1
-                bgr = cv2.cvtColor(data, cv2.COLOR_YUV2BGR_YUYV)
-            self.image = QtGui.QImage(
-                bgr, frame.width, frame.height, QtGui.QImage.Format.Format_BGR888
-            )
+            return
         painter = QtGui.QPainter(self)
         painter.drawImage(QtCore.QPointF(), self.image)
 
 
 def main():
-    def update():
-        frame = next(stream)
-        window.setFrame(frame)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", choices=["YUYV", "MJPG"], default="YUYV")
+    parser.add_argument(
+        "--jpeg-decoder", choices=sorted(JPEG_DECODERS), default="turbojpeg"
+    )
+    parser.add_argument(
+        "--opencl",
+        default=False,
+        action="store_true",
+        help="convert YUYV on the OpenCL device if available",
+    )
+    args = parser.parse_args()
+    decode_jpeg = JPEG_DECODERS[args.jpeg_decoder]()
+    opencl = args.opencl and cv2.ocl.haveOpenCL()
+    cv2.ocl.setUseOpenCL(opencl)
 
     app = QtWidgets.QApplication([])
     window = QVideo()
     window.show()
 
-    timer = QtCore.QTimer()
-    timer.timeout.connect(update)
-
     with Device.from_id(0) as cam:
-        capture = VideoCapture(cam)
+        capture = VideoCapture(cam, size=4)
 
-        capture.set_format(640, 480, "YUYV")
+        capture.set_format(640, 480, args.format)
         print(capture.get_format())
-        stream = iter(cam)
-        timer.start(0)
-        app.exec()
+        with capture:
+            decoder = Decoder(iter(capture), decode_jpeg, opencl)
+            decoder.imageReady.connect(window.setImage)
+            window.released.connect(decoder.release)
+            decoder.start()
+            try:
+                app.exec()
+            finally:
+                decoder.requestInterruption()
+                decoder.wait()
 
 
 if __name__ == "__main__":
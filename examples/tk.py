@@ -4,36 +4,63 @@
 # Copyright (c) 2021 Tiago Coutinho
 # Distributed under the GPLv3 license. See LICENSE for more info.
 
+# install extra requirements:
+# python3 -m pip install pillow PyTurboJPEG
+
 import logging
-from io import BytesIO
-from tkinter import READABLE, Canvas, Tk
+import threading
+from tkinter import Canvas, Tk
 
 from PIL import Image, ImageTk
+from turbojpeg import TJPF_RGB, TurboJPEG
 
 from v4l2py import Device, VideoCapture
 
 fmt = "%(threadName)-10s %(asctime)-15s %(levelname)-5s %(name)s: %(message)s"
 logging.basicConfig(level="INFO", format=fmt)
 
+jpeg = TurboJPEG()
+
+# display refresh period (ms)
+REFRESH = 16
+
+
+def produce(stream, latest, stop):
+    """Acquire and decode frames outside of the Tk thread.
 
-def frame():
-    frame = next(stream)
-    buff = BytesIO(bytes(frame))
-    image = Image.open(buff, formats=["JPEG"])
-    return ImageTk.PhotoImage(image)
+    Only the most recent image is kept (single slot mailbox)
+    """
+    for frame in stream:
+        if stop.is_set():
+            break
+        try:
+            rgb = jpeg.decode(frame.data, pixel_format=TJPF_RGB)
+        except OSError:
+            # cameras do emit corrupt MJPEG frames: skip to the next one
+            logging.exception("Failed to decode frame %d", frame.frame_nb)
+            continue
+        latest[0] = Image.frombuffer(
+            "RGB", (frame.width, frame.height), rgb, "raw", "RGB", 0, 1
+        )
 
 
-def update(cam, mask=None):
-    cam.image = frame()  # don't loose reference
-    canvas.itemconfig(container, image=cam.image)
+def update():
+    image, latest[0] = latest[0], None
+    if image is not None:
+        canvas.image = ImageTk.PhotoImage(image)  # don't loose reference
+        canvas.itemconfig(container, image=canvas.image)
+    window.after(REFRESH, update)
 
 
 with Device.from_id(0) as cam:
-    video_capture = VideoCapture(cam)
+    video_capture = VideoCapture(cam, size=4)
     fmt = video_capture.get_format()
     video_capture.set_format(fmt.width, fmt.height, "MJPG")
     with video_capture as buffers:
-        stream = iter(buffers)
+        latest, stop = [None], threading.Event()
+        producer = threading.Thread(
+            target=produce, args=(iter(buffers), latest, stop), name="Producer"
+        )
         window = Tk()
         window.title("Join")
         window.geometry(f"{fmt.width}x{fmt.height}")
@@ -41,5 +68,10 @@ with Device.from_id(0) as cam:
         canvas = Canvas(window, width=fmt.width, height=fmt.height)
         canvas.pack(side="bottom", fill="both", expand="yes")
         container = canvas.create_image(0, 0, anchor="nw")
-        window.tk.createfilehandler(cam, READABLE, update)
-        window.mainloop()
+        producer.start()
+        window.after(REFRESH, update)
+        try:
+            window.mainloop()
+        finally:
+            stop.set()
+            producer.join()
@@ -1,6 +1,9 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 
-from v4l2py.device import Device, MenuControl, LegacyControl
+from v4l2py.device import Capability, Device, LegacyControl, MenuControl, iter_devices
+
+CAPABILITIES = tuple((cap.value, cap.name.lower()) for cap in Capability)
 
 
 def _get_ctrl(cam, control):
@@ -17,6 +20,33 @@ def _get_ctrl(cam, control):
         return ctrl
 
 
+def _probe(device: Device):
+    try:
+        with device:
+            return device.info
+    except OSError as err:
+        return err
+
+
+def list_devices() -> None:
+    print("Listing all video devices ...\n")
+
+    devices = sorted(iter_devices(), key=lambda device: device.index)
+    # opening a device involves several blocking ioctls: probe concurrently
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        infos = list(executor.map(_probe, devices))
+
+    for device, info in zip(devices, infos):
+        if isinstance(info, OSError):
+            print(f"{device.filename}: {info}")
+            continue
+        device_caps = int(info.device_capabilities)
+        caps = [name for value, name in CAPABILITIES if device_caps & value == value]
+        print(f"{device.filename}: {info.card} ({info.driver}, {info.bus_info})")
+        print(f"    capabilities: {', '.join(caps)}")
+    print("")
+
+
 def show_control_status(device: str, legacy_controls: bool) -> None:
     with Device(device, legacy_controls=legacy_controls) as cam:
         print("Showing current status of all controls ...\n")
@@ -132,6 +162,12 @@ def csv(string: str) -> list:
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--list-devices",
+        default=False,
+        action="store_true",
+        help="list all video devices",
+    )
     parser.add_argument(
         "--legacy",
         default=False,
@@ -186,7 +222,9 @@ if __name__ == "__main__":
     else:
         dev = args.device
 
-    if args.reset_all:
+    if args.list_devices:
+        list_devices()
+    elif args.reset_all:
         reset_all_controls(dev, args.legacy)
     elif args.reset_ctrl:
         reset_controls(dev, args.reset_ctrl, args.legacy)
@@ -31,10 +31,12 @@ INDEX = """\
 
 def gen_frames():
     with Device.from_id(0) as device:
-        capture = VideoCapture(device)
+        capture = VideoCapture(device, size=4)
         capture.set_format(640, 480, "MJPG")
-        for frame in device:
-            yield b"".join((PREFIX, bytes(frame), SUFFIX))
+        with capture as stream:
+            for frame in stream:
+                # one item per frame: a single write (chunk) per frame
+                yield b"".join((PREFIX, frame.data, SUFFIX))
 
 
 @app.get("/")
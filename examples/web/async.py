@@ -6,18 +6,29 @@
 
 # Extra dependencies required to run this example:
 # python3 -m pip install fastapi jinja2 python-multipart opencv-python \
-# pillow uvicorn
+# pillow PyTurboJPEG uvicorn uvloop
 
 # run from this directory with:
-# uvicorn async:app
+# uvicorn --loop uvloop async:app
 
 """FastAPI example for v4l2py"""
 
 import asyncio
+import concurrent.futures
+import functools
 import logging
+import threading
+import time
 from typing import Annotated
 
-from common import BOUNDARY, BaseCamera, frame_to_image
+from common import (
+    BOUNDARY,
+    JPEG_FORMATS,
+    KEEPALIVE,
+    KEEPALIVE_PERIOD,
+    BaseCamera,
+    frame_to_image,
+)
 from fastapi import FastAPI, Form, Request
 from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
@@ -32,25 +43,85 @@ logging.basicConfig(
 
 log = logging.getLogger(__name__)
 
+CAMERAS_LOCK = threading.Lock()
+
 
 class Camera(BaseCamera):
     def __init__(self, device: Device) -> None:
         super().__init__(device)
-        self.clients: asyncio.Queue = asyncio.Queue()
+        self.nb_clients: int = 0
+        # latest image + version counter: one wake up per frame for all clients
+        self.image: bytes = b""
+        self.version: int = 0
+        self.image_ready: asyncio.Event = asyncio.Event()
         self.runner: None | asyncio.Task = None
-
-    async def get_clients(self, timeout=None) -> None | list[asyncio.Queue]:
-        first_client = self.clients.get()
-        if timeout is None:
-            clients = [await first_client]
+        # control updates are coalesced: only the latest value gets written
+        self.pending_controls: dict[int, int] = {}
+        self.control_writer: None | asyncio.Task = None
+        # CPU bound conversions (GREY, YUYV) run here, away from the event loop
+        self.encoder = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+    async def subscribe(self):
+        """Stream of images. A slow client skips to the latest image"""
+        self.nb_clients += 1
+        version = self.version
+        try:
+            while True:
+                if version == self.version:
+                    try:
+                        await asyncio.wait_for(
+                            self.image_ready.wait(), KEEPALIVE_PERIOD
+                        )
+                    except asyncio.TimeoutError:
+                        yield KEEPALIVE
+                        continue
+                version = self.version
+                yield self.image
+        finally:
+            self.nb_clients -= 1
+
+    def publish(self, image) -> None:
+        self.image = image
+        self.version += 1
+        self.image_ready.set()
+        self.image_ready.clear()
+
+    async def set_control(self, control_id: int, value: int) -> None:
+        loop = asyncio.get_running_loop()
+        if self.is_running:
+            # device is held open by run(): coalesce bursts (ex: dragging a
+            # slider) so only the latest value of each control gets written
+            self.pending_controls[control_id] = value
+            if self.control_writer is None or self.control_writer.done():
+                self.control_writer = asyncio.create_task(self.flush_controls())
         else:
-            try:
-                clients = [await asyncio.wait_for(first_client, timeout)]
-            except asyncio.TimeoutError:
-                return
-        while not self.clients.empty():
-            clients.append(self.clients.get_nowait())
-        return clients
+            # opening the device reads all its info: keep it off the event loop
+            await loop.run_in_executor(None, self.write_control, control_id, value)
+
+    async def flush_controls(self) -> None:
+        loop = asyncio.get_running_loop()
+        # updates arriving while a batch is written go in the next batch
+        while self.pending_controls:
+            await asyncio.sleep(0.01)
+            pending, self.pending_controls = self.pending_controls, {}
+            await loop.run_in_executor(None, self.write_controls, pending)
+
+    def write_control(self, control_id: int, value: int) -> None:
+        with self.device:
+            control = self.device.controls[control_id]
+            self.device.log.info("setting %s to %s", control.name, value)
+            control.value = value
+
+    def write_controls(self, controls: dict[int, int]) -> None:
+        with self.device:
+            for control_id, value in controls.items():
+                try:
+                    self.write_control(control_id, value)
+                except (KeyError, OSError):
+                    # don't let one bad control drop the rest of the batch
+                    self.device.log.exception(
+                        "failed to set control %s to %s", control_id, value
+                    )
 
     def start(self) -> None:
         if not self.is_running:
@@ -69,30 +140,40 @@ class Camera(BaseCamera):
         return not (self.runner is None or self.runner.done())
 
     async def run(self):
+        loop = asyncio.get_running_loop()
         with self.device:
             self.capture.set_format(640, 480, "MJPG")
             with self.capture as frames:
+                last_seen = time.monotonic()
                 async for frame in frames:
-                    if clients := await self.get_clients(timeout=3):
-                        data = frame_to_image(frame)
-                        for client in clients:
-                            await client.put(data)
-                    else:
+                    now = time.monotonic()
+                    if self.nb_clients:
+                        last_seen = now
+                        if frame.pixel_format in JPEG_FORMATS:
+                            data = frame_to_image(frame)
+                        else:
+                            data = await loop.run_in_executor(
+                                self.encoder, frame_to_image, frame
+                            )
+                        self.publish(data)
+                    elif now - last_seen > 3:
                         self.device.log.info("Stopping camera task due to inactivity")
                         break
 
 
-CAMERAS = None
+@functools.cache
+def open_cameras() -> dict[int, Camera]:
+    return {
+        device.index: Camera(device)
+        for device in iter_video_capture_devices(legacy_controls=True)
+    }
 
 
-def cameras() -> list[Camera]:
-    global CAMERAS
-    if CAMERAS is None:
-        cameras = {}
-        for device in iter_video_capture_devices(legacy_controls=True):
-            cameras[device.index] = Camera(device)
-        CAMERAS = cameras
-    return CAMERAS
+def cameras() -> dict[int, Camera]:
+    # sync endpoints run concurrently in FastAPI's threadpool and
+    # functools.cache does not prevent two concurrent first calls
+    with CAMERAS_LOCK:
+        return open_cameras()
 
 
 app = FastAPI()
@@ -100,11 +181,15 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates", line_statement_prefix="#")
 
 
+@functools.cache
+def index_html() -> str:
+    # the camera list is fixed once enumerated: render the page only once
+    return templates.get_template("index.html").render(cameras=cameras())
+
+
 @app.get("/")
-def index(request: Request):
-    return templates.TemplateResponse(
-        "index.html", {"request": request, "cameras": cameras()}
-    )
+def index():
+    return HTMLResponse(index_html())
 
 
 @app.get("/camera/{device_id}")
@@ -135,14 +220,8 @@ async def stop(device_id: int):
 async def stream(device_id: int):
     camera = cameras()[device_id]
 
-    async def gen_frames():
-        queue = asyncio.Queue()
-        while True:
-            await camera.clients.put(queue)
-            yield await queue.get()
-
     return StreamingResponse(
-        gen_frames(), media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+        camera.subscribe(), media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}"
     )
 
 
@@ -156,18 +235,15 @@ def set_format(device_id: int, value: Annotated[str, Form()]):
 
 
 @app.post("/camera/{device_id}/control/{control_id}")
-def set_control(device_id: int, control_id: int, value: str = Form(default="0")):
+async def set_control(device_id: int, control_id: int, value: str = Form(default="0")):
     camera = cameras()[device_id]
-    with camera.device:
-        control = camera.device.controls[control_id]
-        camera.device.log.info("setting %s to %s", control.name, value)
-        if value == "on":
-            value = 1
-        elif value == "off":
-            value = 0
-        else:
-            value = int(value)
-        control.value = value
+    if value == "on":
+        value = 1
+    elif value == "off":
+        value = 0
+    else:
+        value = int(value)
+    await camera.set_control(control_id, value)
     return "", 204
 
 
@@ -6,50 +6,114 @@
 
 """Common tools for async and sync web app examples"""
 
+import functools
 import io
+import logging
 
 import cv2
+import numpy
 import PIL.Image
 
+# optional SIMD JPEG encoding: python3 -m pip install PyTurboJPEG
+try:
+    from turbojpeg import TJPF_GRAY, TJSAMP_422, TJSAMP_GRAY, TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
 from v4l2py.device import Device, PixelFormat, VideoCapture
 
 BOUNDARY = "frame"
-HEADER = (
-    "--{boundary}\r\nContent-Type: image/{type}\r\nContent-Length: {length}\r\n\r\n"
-)
+HEADER = "--{boundary}\r\nContent-Type: image/{type}\r\nContent-Length: "
 SUFFIX = b"\r\n"
 
+# passed through as is by frame_to_image: cheap, no need for a worker thread
+JPEG_FORMATS = {PixelFormat.JPEG, PixelFormat.MJPEG}
+
+log = logging.getLogger(__name__)
+
+jpeg = None if TurboJPEG is None else TurboJPEG()
+
 
 class BaseCamera:
     def __init__(self, device: Device) -> None:
         self.device: Device = device
-        self.capture: VideoCapture = VideoCapture(self.device)
+        # 4 buffers (instead of the default 2) absorb scheduling jitter
+        self.capture: VideoCapture = VideoCapture(self.device, size=4)
         with device:
             self.info = self.device.info
 
 
 def frame_to_image(frame, output="jpeg"):
-    if frame.pixel_format in (PixelFormat.JPEG, PixelFormat.MJPEG):
+    if frame.pixel_format in JPEG_FORMATS:
         if output == "jpeg":
+            # already JPEG: send as is, never decode + re-encode
             return to_image_send(frame.data, type=output)
-        else:
-            buff = io.BytesIO()
-            image = PIL.Image.open(io.BytesIO(frame.data))
-    elif frame.pixel_format == PixelFormat.GREY:
-        data = frame.array
-        data.shape = frame.height, frame.width, -1
-        image = PIL.Image.frombuffer("L", (frame.width, frame.height), data)
+        image = PIL.Image.open(io.BytesIO(frame.data))
+        return encode_image(image, output)
+    warn_python_encode(frame.pixel_format)
+    if frame.pixel_format == PixelFormat.GREY:
+        if output == "jpeg" and jpeg is not None:
+            data = jpeg.encode(
+                frame_array(frame), pixel_format=TJPF_GRAY, jpeg_subsample=TJSAMP_GRAY
+            )
+            return to_image_send(data, type=output)
+        size = frame.width, frame.height
+        image = PIL.Image.frombuffer("L", size, frame.data, "raw", "L", 0, 1)
     elif frame.pixel_format == PixelFormat.YUYV:
-        data = frame.array
-        data.shape = frame.height, frame.width, -1
+        data = frame_array(frame)
+        if output == "jpeg" and jpeg is not None:
+            # encode YUV 4:2:2 directly: no color conversion to RGB
+            yuv = yuyv_to_planar(data)
+            data = jpeg.encode_from_yuv(
+                yuv, frame.height, frame.width, jpeg_subsample=TJSAMP_422
+            )
+            return to_image_send(data, type=output)
         rgb = cv2.cvtColor(data, cv2.COLOR_YUV2RGB_YUYV)
         image = PIL.Image.fromarray(rgb)
+    return encode_image(image, output)
+
 
+def encode_image(image, output="jpeg"):
     buff = io.BytesIO()
     image.save(buff, output)
     return to_image_send(buff.getvalue(), type=output)
 
 
+@functools.cache
+def warn_python_encode(pixel_format):
+    log.warning("camera sends %s frames: encoding JPEG on the CPU", pixel_format.name)
+
+
+def frame_array(frame):
+    """Frame data as a (height, width, channels) array (no copy)"""
+    fmt = frame.format
+    return numpy.frombuffer(frame.data, dtype="u1").reshape(fmt.height, fmt.width, -1)
+
+
+def yuyv_to_planar(data):
+    """Packed YUYV (height, width, 2) array to planar Y, U, V (4:2:2) buffer"""
+    return numpy.concatenate(
+        (data[..., 0], data[:, 0::2, 1], data[:, 1::2, 1]), axis=None
+    )
+
+
+@functools.cache
+def header_prefix(type="jpeg", boundary=BOUNDARY) -> bytes:
+    return HEADER.format(type=type, boundary=boundary).encode()
+
+
+def black_image(type="jpeg"):
+    buff = io.BytesIO()
+    PIL.Image.new("L", (1, 1)).save(buff, type)
+    return buff.getvalue()
+
+
 def to_image_send(data, type="jpeg", boundary=BOUNDARY):
-    header = HEADER.format(type=type, boundary=boundary, length=len(data)).encode()
+    """Multipart chunk for one image: a single server write per frame"""
+    header = b"%s%d\r\n\r\n" % (header_prefix(type, boundary), len(data))
     return b"".join((header, data, SUFFIX))
+
+
+# sent to clients while the camera is idle so browsers don't time out
+KEEPALIVE = to_image_send(black_image())
+KEEPALIVE_PERIOD = 1
@@ -0,0 +1,22 @@
+#
+# This file is part of the v4l2py project
+#
+# Copyright (c) 2023 Tiago Coutinho
+# Distributed under the GPLv3 license. See LICENSE for more info.
+
+# gunicorn settings for the sync (flask + gevent) example.
+# Loaded automatically when running from this directory with:
+# gunicorn sync:app
+
+# A camera is owned by the process that opened it so every request for a
+# given camera must reach the same process: run a single worker.
+# To spread the encoding of several cameras over several CPUs, run one
+# server per group of cameras instead (V4L2PY_CAMERAS is a comma separated
+# list of device indexes):
+# V4L2PY_CAMERAS=0 gunicorn --bind=0.0.0.0:8000 sync:app
+# V4L2PY_CAMERAS=2 gunicorn --bind=0.0.0.0:8001 sync:app
+
+bind = "0.0.0.0:8000"
+worker_class = "gevent"
+workers = 1
+loglevel = "debug"
@@ -5,23 +5,36 @@
 # Distributed under the GPLv3 license. See LICENSE for more info.
 
 # Extra dependencies required to run this example:
-# python3 -m pip install pillow opencv-python flask gunicorn gevent
+# python3 -m pip install pillow opencv-python PyTurboJPEG flask gunicorn gevent
 
-# run from this directory with:
-# gunicorn --bind=0.0.0.0:8000 --log-level=debug --worker-class=gevent sync:app
+# run from this directory with (see gunicorn.conf.py):
+# gunicorn sync:app
 
 """Flask example for v4l2py"""
 
+import collections
+import functools
 import logging
+import os
+import socket
+import time
 
 import flask
 import gevent
 import gevent.event
 import gevent.fileobject
+import gevent.lock
 import gevent.monkey
-import gevent.queue
+import gevent.threadpool
 import gevent.time
-from common import BOUNDARY, BaseCamera, frame_to_image
+from common import (
+    BOUNDARY,
+    JPEG_FORMATS,
+    KEEPALIVE,
+    KEEPALIVE_PERIOD,
+    BaseCamera,
+    frame_to_image,
+)
 
 from v4l2py.device import ControlType, Device, iter_video_capture_devices
 from v4l2py.io import GeventIO
@@ -39,7 +52,13 @@ logging.basicConfig(
 log = logging.getLogger(__name__)
 
 
-CAMERAS = None
+CAMERAS_LOCK = gevent.lock.Semaphore()
+
+
+def camera_indexes() -> None | set[int]:
+    """Device indexes served by this process (None means all)"""
+    if indexes := os.environ.get("V4L2PY_CAMERAS"):
+        return {int(index) for index in indexes.split(",")}
 
 
 class StreamResponse(flask.Response):
@@ -51,22 +70,48 @@ class StreamResponse(flask.Response):
         kwargs["mimetype"] = mimetype.format(boundary=self.boundary)
         super().__init__(*args, **kwargs)
 
+    def __call__(self, environ, start_response):
+        sock = environ.get("gunicorn.socket") or environ.get("werkzeug.socket")
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            # each frame is written in one go: don't let Nagle delay it
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return super().__call__(environ, start_response)
+
 
 class Camera(BaseCamera):
     def __init__(self, device: Device) -> None:
         super().__init__(device)
-        self.clients: gevent.queue.Queue = gevent.queue.Queue()
+        # one (ready event, latest image) per subscriber
+        self.subscribers: dict[gevent.event.Event, collections.deque] = {}
         self.runner: gevent.Greenlet | None = None
+        # native thread: encoding overlaps with the acquisition of next frame
+        self.encoder = gevent.threadpool.ThreadPool(1)
+
+    def subscribe(self):
+        """Generate images as they are produced.
 
-    def get_clients(self, timeout=None) -> None | list[gevent.queue.Queue]:
+        A slow subscriber only ever gets the most recent image
+        """
+        ready = gevent.event.Event()
+        # maxlen=1: a new image replaces the one the client did not consume yet
+        latest = self.subscribers[ready] = collections.deque(maxlen=1)
         try:
-            with gevent.Timeout(timeout):
-                clients = [self.clients.get()]
-        except gevent.Timeout:
-            return
-        while not self.clients.empty():
-            clients.append(self.clients.get_nowait())
-        return clients
+            while True:
+                if not ready.wait(KEEPALIVE_PERIOD):
+                    yield KEEPALIVE
+                    continue
+                ready.clear()
+                yield latest.popleft()
+        finally:
+            del self.subscribers[ready]
+
+    def encode_and_publish(self, frame) -> None:
+        self.publish(self.encoder.apply(frame_to_image, (frame,)))
+
+    def publish(self, data) -> None:
+        for ready, latest in self.subscribers.items():
+            latest.append(data)
+            ready.set()
 
     def start(self) -> None:
         if not self.is_running:
@@ -85,29 +130,53 @@ class Camera(BaseCamera):
 
     def run(self):
         with self.device:
-            for frame in self.device:
-                if clients := self.get_clients(timeout=3):
-                    data = frame_to_image(frame)
-                    for client in clients:
-                        client.put(data)
-                else:
-                    self.device.log.info("Stopping camera task due to inactivity")
-                    break
-
-
-def cameras() -> list[Camera]:
-    global CAMERAS
-    if CAMERAS is None:
-        cameras = {}
-        for device in iter_video_capture_devices(io=GeventIO):
-            cameras[device.index] = Camera(device)
-        CAMERAS = cameras
-    return CAMERAS
+            # let the camera encode JPEG: no conversion in python
+            self.capture.set_format(640, 480, "MJPG")
+            with self.capture as frames:
+                last_seen = time.monotonic()
+                encoding = None
+                for frame in frames:
+                    # only encode if someone is watching
+                    if self.subscribers:
+                        last_seen = time.monotonic()
+                        if frame.pixel_format in JPEG_FORMATS:
+                            # header formatting only: no need for a thread
+                            self.publish(frame_to_image(frame))
+                        elif encoding is None or encoding.ready():
+                            # one frame in flight, published as soon as encoded;
+                            # frames arriving meanwhile are dropped
+                            encoding = gevent.spawn(self.encode_and_publish, frame)
+                    elif time.monotonic() - last_seen > 3:
+                        self.device.log.info("Stopping camera task due to inactivity")
+                        break
+
+
+@functools.cache
+def open_cameras() -> dict[int, Camera]:
+    indexes = camera_indexes()
+    return {
+        device.index: Camera(device)
+        for device in iter_video_capture_devices(io=GeventIO)
+        if indexes is None or device.index in indexes
+    }
+
+
+def cameras() -> dict[int, Camera]:
+    # opening devices yields to other greenlets and functools.cache does not
+    # prevent two concurrent first calls: serialize them
+    with CAMERAS_LOCK:
+        return open_cameras()
+
+
+@functools.cache
+def index_html() -> str:
+    # the camera list is fixed once enumerated: render the page only once
+    return flask.render_template("index.html", cameras=cameras())
 
 
 @app.get("/")
 def index():
-    return flask.render_template("index.html", cameras=cameras())
+    return index_html()
 
 
 @app.post("/camera/<int:device_id>/start")
@@ -139,14 +208,7 @@ def device(device_id: int):
 @app.get("/camera/<int:device_id>/stream")
 def stream(device_id):
     camera = cameras()[device_id]
-
-    def gen_frames():
-        client = gevent.queue.Queue()
-        while True:
-            camera.clients.put(client)
-            yield client.get()
-
-    return StreamResponse(gen_frames())
+    return StreamResponse(camera.subscribe())
 
 
 @app.post("/camera/<int:device_id>/format")
@@ -186,5 +248,9 @@ def reset_control(device_id, control_id):
     )
 
 
+# enumerate devices while the server boots, not on the first request
+gevent.spawn(cameras)
+
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0")
@@ -40,11 +40,12 @@ logging.basicConfig(
 
 async def gen_frames():
     with Device.from_id(0) as device:
-        capture = VideoCapture(device)
+        capture = VideoCapture(device, size=4)
         capture.set_format(640, 480, "MJPG")
         with capture as stream:
             async for frame in stream:
-                yield b"".join((PREFIX, bytes(frame), SUFFIX))
+                # one item per frame: a single write (chunk) per frame
+                yield b"".join((PREFIX, frame.data, SUFFIX))
 
 
 @app.get("/")
@@ -5,14 +5,18 @@
 # Distributed under the GPLv3 license. See LICENSE for more info.
 
 import os
-from contextlib import ExitStack, contextmanager
+from contextlib import contextmanager
 from errno import EINVAL
 from inspect import isgenerator
 from math import isclose
 from pathlib import Path
 from random import randint
-from unittest import mock
+from types import SimpleNamespace
 
+import linuxpy.device
+import linuxpy.io
+import linuxpy.ioctl
+import linuxpy.video.device
 from ward import each, fixture, raises, test
 
 try:
@@ -38,7 +42,7 @@ class MemoryMap:
 
     def __getitem__(self, item):
         assert item.start is None
-        assert item.stop == len(self.hardware.frame)
+        assert item.stop == self.hardware.frame_len
         assert item.step is None
         return self.hardware.frame
 
@@ -46,44 +50,78 @@ class MemoryMap:
         pass
 
 
+MISSING = object()
+
+
+@contextmanager
+def patch_attributes(patches):
+    """Replace (target, name, value) attributes; much cheaper than mock.patch"""
+    saved = [
+        (target, name, vars(target).get(name, MISSING)) for target, name, _ in patches
+    ]
+    for target, name, value in patches:
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for target, name, original in reversed(saved):
+            if original is MISSING:
+                delattr(target, name)
+            else:
+                setattr(target, name, original)
+
+
+# never mutated: shared by all Hardware instances
+FRAME = 640 * 480 * 3 * b"\x01"
+FRAME_ARRAY = None if numpy is None else numpy.frombuffer(FRAME, dtype="u1")
+
+
 class Hardware:
+    # (target, name) replaced by the Hardware method of the same name
+    PATCHES = (
+        (linuxpy.ioctl.fcntl, "ioctl"),
+        (linuxpy.io, "open"),
+        (linuxpy.video.device.mmap, "mmap"),
+        (linuxpy.io.IO, "select"),
+        (linuxpy.device.os, "get_blocking"),
+    )
+
     def __init__(self, filename="/dev/video39"):
         self.filename = filename
-        self.fd = None
-        self.fobj = None
         self.input0_name = b"my camera"
         self.driver = b"mock"
         self.card = b"mock camera"
         self.bus_info = b"mock:usb"
         self.version = 5 << 16 | 4 << 8 | 12
         self.version_str = "5.4.12"
+        self.frame = FRAME
+        self.frame_len = len(FRAME)
+        self.reset()
+
+    def reset(self):
+        """Back to the initial state (closed, not streaming)"""
+        self.fd = None
+        self.fobj = None
         self.video_capture_state = "OFF"
         self.blocking = None
-        self.frame = 640 * 480 * 3 * b"\x01"
 
     def __enter__(self):
-        self.stack = ExitStack()
-        ioctl = mock.patch("linuxpy.ioctl.fcntl.ioctl", self.ioctl)
-        opener = mock.patch("linuxpy.io.open", self.open)
-        mmap = mock.patch("linuxpy.video.device.mmap.mmap", self.mmap)
-        select = mock.patch("linuxpy.io.IO.select", self.select)
-        blocking = mock.patch("linuxpy.device.os.get_blocking", self.get_blocking)
-        self.stack.enter_context(ioctl)
-        self.stack.enter_context(opener)
-        self.stack.enter_context(mmap)
-        self.stack.enter_context(select)
-        self.stack.enter_context(blocking)
+        patches = [(target, name, getattr(self, name)) for target, name in self.PATCHES]
+        self.patches = patch_attributes(patches)
+        self.patches.__enter__()
         return self
 
     def __exit__(self, exc_type, exc_value, tb):
-        self.stack.close()
+        self.patches.__exit__(exc_type, exc_value, tb)
 
     def open(self, filename, mode, buffering=-1, opener=None):
         self.fd = randint(100, 1000)
-        self.fobj = mock.Mock()
-        self.fobj.fileno.return_value = self.fd
-        self.fobj.get_blocking.return_value = False
-        self.fobj.closed = False
+        self.fobj = SimpleNamespace(
+            fileno=lambda fd=self.fd: fd,
+            get_blocking=lambda: False,
+            close=lambda: None,
+            closed=False,
+        )
         return self.fobj
 
     def get_blocking(self, fd):
@@ -94,45 +132,66 @@ class Hardware:
     def closed(self):
         return self.fd is not None
 
-    def ioctl(self, fd, ioc, arg):  # noqa: C901
+    def input_ioctl(self, ioc, arg):
+        if arg.index > 0:
+            raise OSError(EINVAL, "ups!")
+        arg.name = self.input0_name
+        arg.type = raw.InputType.CAMERA
+
+    def query_ext_ctrl_ioctl(self, ioc, arg):
+        if arg.index > 0:
+            raise OSError(EINVAL, "ups!")
+        arg.name = b"brightness"
+        arg.type = raw.CtrlType.INTEGER
+        arg.id = 9963776
+
+    def capability_ioctl(self, ioc, arg):
+        arg.driver = self.driver
+        arg.card = self.card
+        arg.bus_info = self.bus_info
+        arg.version = self.version
+        arg.capabilities = raw.Capability.STREAMING | raw.Capability.VIDEO_CAPTURE
+
+    def format_ioctl(self, ioc, arg):
+        if ioc == raw.IOC.G_FMT:
+            arg.fmt.pix.width = 640
+            arg.fmt.pix.height = 480
+            arg.fmt.pix.pixelformat = raw.PixelFormat.RGB24
+
+    def buffer_ioctl(self, ioc, arg):
+        if ioc == raw.IOC.DQBUF:
+            arg.index = 0
+            arg.bytesused = self.frame_len
+            arg.sequence = 123
+            arg.timestamp.secs = 123
+            arg.timestamp.usecs = 456789
+
+    def stream_on_ioctl(self, ioc, arg):
+        assert arg.value == raw.BufType.VIDEO_CAPTURE
+        self.video_capture_state = "ON"
+
+    def stream_off_ioctl(self, ioc, arg):
+        assert arg.value == raw.BufType.VIDEO_CAPTURE
+        self.video_capture_state = "OFF"
+
+    # ioctl handlers by argument type, then by request
+    ARG_HANDLERS = {
+        raw.v4l2_input: input_ioctl,
+        raw.v4l2_query_ext_ctrl: query_ext_ctrl_ioctl,
+        raw.v4l2_capability: capability_ioctl,
+        raw.v4l2_format: format_ioctl,
+        raw.v4l2_buffer: buffer_ioctl,
+    }
+    IOC_HANDLERS = {
+        raw.IOC.STREAMON: stream_on_ioctl,
+        raw.IOC.STREAMOFF: stream_off_ioctl,
+    }
+
+    def ioctl(self, fd, ioc, arg):
         assert self.fd == fd
-        if isinstance(arg, raw.v4l2_input):
-            if arg.index > 0:
-                raise OSError(EINVAL, "ups!")
-            arg.name = self.input0_name
-            arg.type = raw.InputType.CAMERA
-        elif isinstance(arg, raw.v4l2_query_ext_ctrl):
-            if arg.index > 0:
-                raise OSError(EINVAL, "ups!")
-            arg.name = b"brightness"
-            arg.type = raw.CtrlType.INTEGER
-            arg.id = 9963776
-        elif isinstance(arg, raw.v4l2_capability):
-            arg.driver = self.driver
-            arg.card = self.card
-            arg.bus_info = self.bus_info
-            arg.version = self.version
-            arg.capabilities = raw.Capability.STREAMING | raw.Capability.VIDEO_CAPTURE
-        elif isinstance(arg, raw.v4l2_format):
-            if ioc == raw.IOC.G_FMT:
-                arg.fmt.pix.width = 640
-                arg.fmt.pix.height = 480
-                arg.fmt.pix.pixelformat = raw.PixelFormat.RGB24
-        elif isinstance(arg, raw.v4l2_buffer):
-            if ioc == raw.IOC.QUERYBUF:
-                pass
-            elif ioc == raw.IOC.DQBUF:
-                arg.index = 0
-                arg.bytesused = len(self.frame)
-                arg.sequence = 123
-                arg.timestamp.secs = 123
-                arg.timestamp.usecs = 456789
-        elif ioc == raw.IOC.STREAMON:
-            assert arg.value == raw.BufType.VIDEO_CAPTURE
-            self.video_capture_state = "ON"
-        elif ioc == raw.IOC.STREAMOFF:
-            assert arg.value == raw.BufType.VIDEO_CAPTURE
-            self.video_capture_state = "OFF"
+        handler = self.ARG_HANDLERS.get(type(arg)) or self.IOC_HANDLERS.get(ioc)
+        if handler is not None:
+            handler(self, ioc, arg)
         return 0
 
     def mmap(self, fd, length, offset):
@@ -144,12 +203,20 @@ class Hardware:
         return readers, writers, other
 
 
-@fixture
-def hardware():
+@fixture(scope="module")
+def patched_hardware():
+    # patch once for this module: the patches replace stdlib functions
+    # (fcntl.ioctl, mmap.mmap, ...) so they must not outlive it
     with Hardware() as hardware:
         yield hardware
 
 
+@fixture
+def hardware(hardware=patched_hardware):
+    hardware.reset()
+    return hardware
+
+
 def assert_frame(frame, camera):
     """Helper to compare frame with hardware frame"""
     assert frame.data == camera.frame
@@ -161,22 +228,22 @@ def assert_frame(frame, camera):
     assert frame.type == BufferType.VIDEO_CAPTURE
     assert isclose(frame.timestamp, 123.456789)
     assert bytes(frame) == camera.frame
-    assert len(frame) == len(camera.frame)
-    assert frame.nbytes == len(camera.frame)
+    assert len(frame) == camera.frame_len
+    assert frame.nbytes == camera.frame_len
     if numpy:
-        assert numpy.all(frame.array == numpy.frombuffer(camera.frame, dtype="u1"))
+        assert numpy.array_equal(frame.array, FRAME_ARRAY)
 
 
 @contextmanager
 def video_files(paths=("/dev/video99")):
-    with mock.patch("linuxpy.device.pathlib.Path.glob") as glob:
-        expected_files = list(paths)
-        glob.return_value = expected_files
-        with mock.patch("linuxpy.device.pathlib.Path.is_char_device") as is_char_device:
-            is_char_device.return_value = True
-            with mock.patch("linuxpy.device.os.access") as access:
-                access.return_value = os.R_OK | os.W_OK
-                yield paths
+    expected_files = list(paths)
+    patches = (
+        (Path, "glob", lambda self, pattern: expected_files),
+        (Path, "is_char_device", lambda self: True),
+        (linuxpy.device.os, "access", lambda path, mode: os.R_OK | os.W_OK),
+    )
+    with patch_attributes(patches):
+        yield paths
 
 
 @test("device number")